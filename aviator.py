@@ -3,11 +3,12 @@ import re
 import time
 from dataclasses import dataclass
 from datetime import datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import List, Optional
 from urllib.request import Request, urlopen
+from zoneinfo import ZoneInfo
 
-import pytz
 import airportsdata
 
 
@@ -35,11 +36,47 @@ DEFAULT_YEAR = 2026
 # ============================================================
 # AIRPORTS DB (IATA -> tz/city/name etc.)
 # ============================================================
-AIRPORTS = airportsdata.load("IATA")
+# Flattened airportsdata lookup tables (IATA -> tz / city). Loading the
+# ~28k-row DB costs real import time, so it is deferred to first use and
+# flattened into two plain dicts for single-step lookups on the hot paths.
+_IATA_TZ: Optional[dict] = None
+_IATA_CITY: Optional[dict] = None
+
+
+def _load_airports() -> None:
+    global _IATA_TZ, _IATA_CITY
+    airports = airportsdata.load("IATA")
+    _IATA_TZ = {k: v["tz"] for k, v in airports.items() if v.get("tz")}
+    _IATA_CITY = {k: v["city"] for k, v in airports.items() if v.get("city")}
+
+MONTH_NUM = {
+    "JAN": 1, "FEB": 2, "MAR": 3, "APR": 4, "MAY": 5, "JUN": 6,
+    "JUL": 7, "AUG": 8, "SEP": 9, "OCT": 10, "NOV": 11, "DEC": 12
+}
+
+# Segment-line token patterns, compiled once (parse_segment_line is the hot path).
+# Only kept where capture groups are needed; fixed-shape tokens use the
+# cheaper character checks below instead of the regex engine.
+AIRLINE_MERGED_RE = re.compile(r"^([A-Z0-9]{2,3}?)(\d{1,4})")  # TK1921Y / UA5405D
+AIRLINE_CODE_RE = re.compile(r"^[A-Z0-9]{2,3}$")               # KC / TK / J2
+FLIGHT_NUM_RE = re.compile(r"^(\d{1,4})")                      # 54Y / 909D -> digits
+
+
+def is_time_token(t: str) -> bool:
+    """0435 or 0435+1 style time token."""
+    if len(t) == 4:
+        return t.isdigit()
+    return len(t) >= 6 and t[4] == "+" and t[:4].isdigit() and t[5:].isdigit()
+
+
+def is_date_token(t: str) -> bool:
+    """15MAR style date token: 2 digits + 3 letters."""
+    return len(t) == 5 and t[:2].isdigit() and t[2:].isalpha()
 
-TIME_RE = re.compile(r"^\d{4}(\+\d+)?$")        # 0435 or 0435+1
-SEGMENT_START_RE = re.compile(r"^\s*\d+\s+")    # segment line begins with number
-MONTH_FMT = "%d%b"                               # 15FEB
+
+def route_from_token(t: str) -> str:
+    """First 6 letters of a route token (ALAIST, ALAIST*SS1), or ""."""
+    return t[:6] if len(t) >= 6 and t[:6].isalpha() else ""
 
 RU_MONTH = {
     "JAN": "янв.", "FEB": "февр.", "MAR": "мар.", "APR": "апр.",
@@ -51,7 +88,7 @@ RU_MONTH = {
 # ============================================================
 # DATA CLASSES
 # ============================================================
-@dataclass
+@dataclass(slots=True)
 class Segment:
     airline: str
     flight: str
@@ -110,28 +147,32 @@ def load_ru_overrides_csv(path: str) -> dict:
     MXP,Мальпенса
     LGW,Гатвик
     """
-    data = {}
     if not path:
-        return data
+        return {}
 
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
             # expected headers: iata, airport_ru
-            for row in reader:
-                iata = (row.get("iata") or "").strip().upper()
-                if not iata:
-                    continue
-                data[iata] = (row.get("airport_ru") or "").strip()
+            header = next(reader, None)
+            i_iata = header.index("iata")
+            i_ru = header.index("airport_ru")
+            return {
+                row[i_iata].strip().upper(): row[i_ru].strip()
+                for row in reader
+                if len(row) > max(i_iata, i_ru) and row[i_iata].strip()
+            }
     except Exception:
         return {}
 
-    return data
-
 
-# Load RU overrides on startup (cached)
-_RU_OVERRIDES_LOCAL = ensure_ru_overrides(RU_OVERRIDES_URL)
-RU_OVERRIDES = load_ru_overrides_csv(_RU_OVERRIDES_LOCAL)
+@lru_cache(maxsize=1)
+def _ru_overrides() -> dict:
+    """
+    RU overrides, fetched/refreshed on first use instead of at import.
+    Importing the module no longer issues a (potentially 4s) HTTP request.
+    """
+    return load_ru_overrides_csv(ensure_ru_overrides(RU_OVERRIDES_URL))
 
 
 # ============================================================
@@ -150,105 +191,90 @@ def airline_name(iata2: str) -> str:
 # ============================================================
 # RUSSIAN PLURALS
 # ============================================================
+# Form index (0 -> form1, 1 -> form2, 2 -> form5) for each n % 100,
+# precomputed so plural selection is a table load instead of branching.
+_PLURAL_IDX = bytes(
+    2 if 11 <= n <= 14 else 0 if n % 10 == 1 else 1 if 2 <= n % 10 <= 4 else 2
+    for n in range(100)
+)
+
+
 def plural_ru(n: int, form1: str, form2: str, form5: str) -> str:
-    n = abs(int(n))
-    if 11 <= (n % 100) <= 14:
-        return form5
-    last = n % 10
-    if last == 1:
-        return form1
-    if 2 <= last <= 4:
-        return form2
-    return form5
+    return (form1, form2, form5)[_PLURAL_IDX[abs(int(n)) % 100]]
 
 
-def human_duration(td: timedelta) -> str:
-    total = int(td.total_seconds())
-    if total < 0:
-        total = abs(total)
+_HOUR_FORMS = ("час", "часа", "часов")
+_MINUTE_FORMS = ("минуту", "минуты", "минут")
 
+
+@lru_cache(maxsize=1024)
+def _format_duration(total: int) -> str:
     hours = total // 3600
     minutes = (total % 3600) // 60
 
     parts = []
     if hours > 0:
-        parts.append(f"{hours} {plural_ru(hours, 'час', 'часа', 'часов')}")
+        parts.append(f"{hours} {plural_ru(hours, *_HOUR_FORMS)}")
     if minutes > 0 or hours == 0:
-        parts.append(f"{minutes} {plural_ru(minutes, 'минуту', 'минуты', 'минут')}")
+        parts.append(f"{minutes} {plural_ru(minutes, *_MINUTE_FORMS)}")
     return ", ".join(parts)
 
 
+def human_duration(td: timedelta) -> str:
+    # Same few durations recur across a PNR (typical flight and layover
+    # lengths), so format each distinct second count only once.
+    return _format_duration(abs(int(td.total_seconds())))
+
+
 # ============================================================
 # DATE/TIME PARSING
 # ============================================================
 def parse_date(date_str: str, year: int) -> datetime:
-    date_str = date_str.strip().upper()
-    try:
-        d = datetime.strptime(date_str, MONTH_FMT)
-        return d.replace(year=year)
-    except ValueError:
-        mon = date_str[2:].upper()
-        day = int(date_str[:2])
-        month_map = {
-            "JAN": 1, "FEB": 2, "MAR": 3, "APR": 4, "MAY": 5, "JUN": 6,
-            "JUL": 7, "AUG": 8, "SEP": 9, "OCT": 10, "NOV": 11, "DEC": 12
-        }
-        if mon not in month_map:
-            raise ValueError(f"Unknown month: {mon}")
-        return datetime(year, month_map[mon], day)
-
-
-def pick_times(tokens: List[str]) -> Optional[Tuple[str, str, int]]:
     """
-    Finds first two time tokens anywhere in line.
-    dep: HHMM
-    arr: HHMM or HHMM+1
+    15FEB -> datetime. The shape is always DDMMM, so slice it directly
+    instead of going through strptime's format machinery.
     """
-    times = []
-    for t in tokens:
-        t = t.strip()
-        if TIME_RE.match(t):
-            times.append(t)
+    date_str = date_str.strip().upper()
+    mon = MONTH_NUM.get(date_str[2:5])
+    if mon is None:
+        raise ValueError(f"Unknown month: {date_str[2:5]}")
+    return datetime(year, mon, int(date_str[:2]))
 
-    if len(times) < 2:
-        return None
 
-    dep = times[0]
-    arr_raw = times[1]
+@lru_cache(maxsize=1024)
+def tz_for_iata(iata: str) -> Optional[ZoneInfo]:
+    """
+    Cached timezone for an IATA code (expects uppercase), or None.
+    Constructing a ZoneInfo parses the zone data, so build each zone once.
+    """
+    if _IATA_TZ is None:
+        _load_airports()
+    tz = _IATA_TZ.get(iata)
+    return ZoneInfo(tz) if tz else None
 
-    if "+" in arr_raw:
-        arr, plus = arr_raw.split("+", 1)
-        offset = int(plus)
-    else:
-        arr = arr_raw
-        offset = 0
 
-    return dep[:4], arr[:4], offset
+# Merged display-name table (overrides win over airportsdata cities),
+# built lazily so import stays cheap.
+_DISPLAY: Optional[dict] = None
 
 
-def tz_for_iata(iata: str) -> Optional[str]:
-    info = AIRPORTS.get(iata.upper())
-    return info.get("tz") if info else None
+def _display_names() -> dict:
+    global _DISPLAY
+    if _DISPLAY is None:
+        if _IATA_CITY is None:
+            _load_airports()
+        _DISPLAY = {**_IATA_CITY, **{k: v for k, v in _ru_overrides().items() if v}}
+    return _DISPLAY
 
 
 def place_for_iata(iata: str) -> str:
     """
-    What we display in itinerary:
+    What we display in itinerary (expects uppercase IATA):
     1) airport_ru overrides (e.g. "Мальпенса", "Гатвик")
     2) fallback to airportsdata city (English)
     3) fallback to IATA
     """
-    iata = iata.upper()
-
-    ov = RU_OVERRIDES.get(iata)
-    if ov:
-        return ov
-
-    info = AIRPORTS.get(iata)
-    if info and info.get("city"):
-        return info["city"]
-
-    return iata
+    return _display_names().get(iata, iata)
 
 
 # ============================================================
@@ -262,30 +288,40 @@ def parse_segment_line(line: str, year: int) -> Optional[Segment]:
     - 2 TK1921 C 15MAR 7 ISTGVA HK1 1225 1340 ...
     - 1 TK 353Y 15MAR 7 ALAIST*SS1 0950 1410 ...
     """
-    if not SEGMENT_START_RE.match(line):
+    # Segment lines begin with the segment number; a one-char digit check
+    # filters garbage lines without touching the regex engine.
+    line = line.lstrip()
+    if not line[:1].isdigit():
         return None
 
-    tokens = line.strip().split()
+    tokens = line.split()
     if len(tokens) < 6:
         return None
 
+    # Upper-case each token once; PNR lines are usually uppercase already,
+    # in which case the split tokens can be reused as-is.
+    if line.isupper():
+        utoks = tokens
+    else:
+        utoks = [t.upper() for t in tokens]
+
     # ---- airline + flight detection (supports J2, KC, TK, etc.) ----
     airline = None
     flight_no = None
 
-    t1 = tokens[1].upper()
-    t2 = tokens[2].upper() if len(tokens) > 2 else ""
+    t1 = utoks[1]
+    t2 = utoks[2]
 
     # Case 1: merged like TK1921Y / UA5405D / J254Y (rare)
-    m1 = re.match(r"^([A-Z0-9]{2,3})(\d{1,4})", t1)
+    m1 = AIRLINE_MERGED_RE.match(t1)
     if m1 and len(t1) > len(m1.group(1)):  # means digits really exist
         airline = m1.group(1)
         flight_no = m1.group(2)
         cursor = 2
     else:
         # Case 2: split like J2 54Y / KC 909D / TK 351
-        if re.match(r"^[A-Z0-9]{2,3}$", t1):
-            m2 = re.match(r"^(\d{1,4})", t2)  # take only digits from 54Y / 909D
+        if AIRLINE_CODE_RE.match(t1):
+            m2 = FLIGHT_NUM_RE.match(t2)  # take only digits from 54Y / 909D
             if m2:
                 airline = t1
                 flight_no = m2.group(1)
@@ -295,66 +331,78 @@ def parse_segment_line(line: str, year: int) -> Optional[Segment]:
         else:
             return None
 
-    # Find date token: 2 digits + 3 letters (15MAR)
+    # PNR grammar is positional: the date (15MAR) sits at cursor or right
+    # after a booking-class token, and the route (ALAIST*SS1) within a few
+    # tokens of the date — so search tiny fixed windows instead of the
+    # whole token list, then sweep on for the first two time tokens.
+    n = len(utoks)
+
     date_str = None
-    date_idx = None
-    for i in range(cursor, len(tokens)):
-        cand = tokens[i].upper()
-        if re.match(r"^\d{2}[A-Z]{3}$", cand):
-            date_str = cand
-            date_idx = i
+    route_start = 0
+    for i in range(cursor, min(cursor + 3, n)):
+        if is_date_token(utoks[i]):
+            date_str = utoks[i]
+            route_start = i + 1
             break
-    if not date_str or date_idx is None:
+    if date_str is None:
         return None
 
-    # Find route token: first 6 letters in a token (supports ALAIST*SS1)
     origin = dest = None
-    for i in range(date_idx + 1, len(tokens)):
-        tok = tokens[i].upper()
-        m_route = re.match(r"^([A-Z]{6})", tok)
-        if m_route:
-            route6 = m_route.group(1)
+    times_start = 0
+    for i in range(route_start, min(route_start + 3, n)):
+        route6 = route_from_token(utoks[i])
+        if route6:
             origin, dest = route6[:3], route6[3:]
+            times_start = i + 1
             break
-
-    if not origin or not dest:
+    if origin is None:
         return None
 
-    # Find times (first two HHMM tokens)
-    times = pick_times(tokens)
-    if not times:
+    times: List[str] = []
+    for i in range(times_start, n):
+        if is_time_token(utoks[i]):
+            times.append(utoks[i])
+            if len(times) == 2:
+                break
+    if len(times) < 2:
         return None
-    dep_hhmm, arr_hhmm, arr_offset = times
+
+    # dep: HHMM (a stray +N suffix is ignored), arr: HHMM or HHMM+1
+    dep_hhmm = times[0][:4]
+    arr_raw = times[1]
+    if "+" in arr_raw:
+        arr_hhmm, plus = arr_raw.split("+", 1)
+        arr_offset = int(plus)
+    else:
+        arr_hhmm = arr_raw
+        arr_offset = 0
 
     # Build naive times for dep/arr on base date
     base_date = parse_date(date_str, year)
     dep_naive = base_date.replace(hour=int(dep_hhmm[:2]), minute=int(dep_hhmm[2:]))
     arr_naive = base_date.replace(hour=int(arr_hhmm[:2]), minute=int(arr_hhmm[2:])) + timedelta(days=arr_offset)
 
-    tz_from = tz_for_iata(origin)
-    tz_to = tz_for_iata(dest)
+    dep_tz = tz_for_iata(origin)
+    arr_tz = tz_for_iata(dest)
 
     # Fallback if TZ missing (best effort)
-    if not tz_from or not tz_to:
+    if dep_tz is None or arr_tz is None:
         # naive fix only if no TZ data
         if arr_offset == 0 and arr_naive < dep_naive:
             arr_naive += timedelta(days=1)
         dep_local = dep_naive
         arr_local = arr_naive
     else:
-        dep_tz = pytz.timezone(tz_from)
-        arr_tz = pytz.timezone(tz_to)
+        dep_local = dep_naive.replace(tzinfo=dep_tz)
+        arr_local = arr_naive.replace(tzinfo=arr_tz)
 
-        dep_local = dep_tz.localize(dep_naive)
-        arr_local = arr_tz.localize(arr_naive)
-
-        # ✅ Key fix: adjust arrival by comparing UTC (handles "arrival earlier" by TZ)
-        dep_utc = dep_local.astimezone(pytz.UTC)
-        arr_utc = arr_local.astimezone(pytz.UTC)
-
-        while arr_utc < dep_utc:
-            arr_local = arr_local + timedelta(days=1)
-            arr_utc = arr_local.astimezone(pytz.UTC)
+        # ✅ Key fix: adjust arrival by comparing UTC (handles "arrival earlier" by TZ).
+        # UTC instant = naive - utcoffset, so the comparison only needs the two
+        # offsets — no astimezone round-trips, no day-by-day loop.
+        elapsed = (arr_naive - dep_naive) - (arr_local.utcoffset() - dep_local.utcoffset())
+        if elapsed < timedelta(0):
+            days_ahead = -(elapsed // timedelta(days=1))
+            arr_local = (arr_naive + timedelta(days=days_ahead)).replace(tzinfo=arr_tz)
 
     return Segment(
         airline=airline,
@@ -371,18 +419,25 @@ def parse_segment_line(line: str, year: int) -> Optional[Segment]:
 # ============================================================
 # ITINERARY BUILDING
 # ============================================================
+def _hm(dt: datetime) -> str:
+    # cheaper than strftime('%H:%M'), which re-parses the format per call
+    return f"{dt.hour:02d}:{dt.minute:02d}"
+
+
+@lru_cache(maxsize=512)
 def format_date_ru(date_str: str) -> str:
-    date_str = date_str.strip().upper()
-    day = date_str[:2].lstrip("0")
-    mon = date_str[2:].upper()
-    return f"{day} {RU_MONTH.get(mon, mon)}"
+    # date_str is already canonical uppercase DDMMM (see parse_segment_line)
+    mon = date_str[2:5]
+    return f"{int(date_str[:2])} {RU_MONTH.get(mon, mon)}"
 
 
 def build_itinerary(text: str, year: Optional[int] = None) -> str:
     if year is None:
         year = datetime.now().year
 
-    lines = [ln.rstrip("\n") for ln in text.splitlines() if ln.strip()]
+    # One pass over the text: keep only lines that can start a segment
+    # (leading digit), so noise lines never reach parse_segment_line.
+    lines = [ln for ln in text.splitlines() if ln.lstrip()[:1].isdigit()]
     segments: List[Segment] = []
 
     for ln in lines:
@@ -408,7 +463,7 @@ def build_itinerary(text: str, year: Optional[int] = None) -> str:
         carrier = f", {s.airline_name}" if s.airline_name else ""
 
         out.append(
-            f"🗓️{format_date_ru(s.date_str)} {s.dep_local.strftime('%H:%M')} – {s.arr_local.strftime('%H:%M')}, "
+            f"🗓️{format_date_ru(s.date_str)} {_hm(s.dep_local)} – {_hm(s.arr_local)}, "
             f"{place_for_iata(s.origin)} — {place_for_iata(s.dest)}, "
             f"{s.airline} {s.flight}{carrier}. {dur}"
         )
@@ -50,4 +50,11 @@ def test_route_with_star_suffix():
     out = build_itinerary(text, year=2026)
     assert "TK 353" in out
     assert "TK 1875" in out
-    assert "Пересадка" in out
\ No newline at end of file
+    assert "Пересадка" in out
+def test_departure_time_with_plus_suffix():
+    text = """
+1 TK 350 C 25MAR 3 ISTALA HK1 2110+1 0435+1 333 E 0 M SEE RTSVC
+"""
+    out = build_itinerary(text, year=2026)
+    assert "TK 350" in out
+    assert "21:10" in out